@@ -8,14 +8,30 @@ so I created this script.
 '''
 
 from argparse import ArgumentParser
-from csv import DictReader
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from itertools import islice
+from lxml import etree as ET
+from math import floor
 from pathlib import Path
-from typing import Dict, Iterable, List
-from xml.etree import ElementTree as ET
-
-from georgio import great_circle_distance
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import csv
+import numpy as np
+import os
+import re
+
+XSI_NAMESPACE = 'http://www.w3.org/2001/XMLSchema-instance'
+EARTH_RADIUS_METERS = 6371008.8 # IUGG mean radius
+PRIVACY_ZONE_BATCH_SIZE = 4096
+GRID_ROW_STRIDE = 1 << 32 # packs a (row, column) grid cell into one int64 key
+MIN_GRID_CELL_SIZE = 1e-6 # radians, about 6m, so zero radius zones still get a usable grid
+OUTPUT_BUFFER_SIZE = 1 << 20
+WRITER_THREADS = min(8, os.cpu_count() or 1)
+SEPARATION_THRESHOLD = timedelta(minutes=90)
+GPX_TIME_PATTERN = re.compile(r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:?\d{2})?$')
+GPX_CREATOR = 'https://github.com/billallen256/photography/blob/master/gpx_per_day.py'
 
 @dataclass
 class Point:
@@ -28,24 +44,117 @@ class PrivacyZone:
     radius_meters: float
     point: Point
 
-def offset_datetime(dt: datetime, epoch_offset: int) -> datetime:
-    epoch_offset_delta = timedelta(days=1024*7*epoch_offset)
-    return dt + epoch_offset_delta
+class PrivacyZones:
+    '''
+    Keeps the zone centers (in radians) and radii in NumPy arrays so
+    a batch of points can be checked against every zone with a single
+    vectorized haversine rather than one distance call per point and
+    zone.
+    '''
+    def __init__(self, privacy_zones: List[PrivacyZone]):
+        self.privacy_zones = privacy_zones
+        self.latitudes = np.radians([pz.point.latitude for pz in privacy_zones])
+        self.longitudes = np.radians([pz.point.longitude for pz in privacy_zones])
+        self.cos_latitudes = np.cos(self.latitudes)
+        self.radii = np.array([pz.radius_meters for pz in privacy_zones])
+
+        # Angular half-widths of each zone's lat/lon bounding box.  The
+        # longitude bound is the exact one for a spherical cap, and opens
+        # up to the whole circle when the zone reaches over a pole.
+        self.latitude_deltas = self.radii / EARTH_RADIUS_METERS
+
+        with np.errstate(divide='ignore'):
+            ratios = np.sin(self.latitude_deltas) / self.cos_latitudes
+
+        self.longitude_deltas = np.where(ratios < 1, np.arcsin(np.minimum(ratios, 1)), np.pi)
+
+        # Grid index over the bounding boxes, with cells as big as the
+        # widest box.  Each zone is filed under every cell its box
+        # overlaps (wrapping around the antimeridian), so a point only
+        # has to be tested against the zones filed under its own cell.
+        self.cell_size = max(self.latitude_deltas.max(), self.longitude_deltas.max(), MIN_GRID_CELL_SIZE) if len(privacy_zones) > 0 else 1.0
+        grid = []
+
+        for zone, (latitude, longitude, latitude_delta, longitude_delta) in enumerate(zip(
+                self.latitudes, self.longitudes, self.latitude_deltas, self.longitude_deltas)):
+            for shift in (-2 * np.pi, 0, 2 * np.pi):
+                west = longitude + shift - longitude_delta
+                east = longitude + shift + longitude_delta
+
+                if east < -np.pi or west > np.pi:
+                    continue
+
+                for row in range(floor((latitude - latitude_delta) / self.cell_size), floor((latitude + latitude_delta) / self.cell_size) + 1):
+                    for column in range(floor(west / self.cell_size), floor(east / self.cell_size) + 1):
+                        grid.append((row * GRID_ROW_STRIDE + column, zone))
+
+        grid.sort()
+        self.cell_keys = np.array([key for key, _ in grid], dtype=np.int64)
+        self.cell_zones = np.array([zone for _, zone in grid], dtype=np.intp)
+
+    def __len__(self):
+        return len(self.privacy_zones)
+
+    def candidates(self, latitudes: np.ndarray, longitudes: np.ndarray):
+        '''
+        Looks up the grid cell of each point (in radians) and returns
+        parallel arrays of the point and zone indices to be tested,
+        ordered by point and then by zone.
+        '''
+        keys = np.floor(latitudes / self.cell_size).astype(np.int64) * GRID_ROW_STRIDE \
+            + np.floor(longitudes / self.cell_size).astype(np.int64)
+        starts = np.searchsorted(self.cell_keys, keys, side='left')
+        counts = np.searchsorted(self.cell_keys, keys, side='right') - starts
+        points = np.repeat(np.arange(len(keys)), counts)
+        offsets = np.arange(len(points)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return points, self.cell_zones[np.repeat(starts, counts) + offsets]
+
+def get_epoch_offset_delta(epoch_offset: int) -> timedelta:
+    return timedelta(days=1024*7*epoch_offset)
+
+def parse_gpx_time(s: str) -> datetime:
+    '''
+    GPX times are nearly always YYYY-MM-DDTHH:MM:SSZ, so slicing the
+    fields out directly avoids the considerable overhead of strptime.
+    Anything else, such as fractional seconds or a UTC offset, falls
+    back to a precompiled regex and is normalized to UTC.
+    '''
+    if len(s) == 20 and s[10] == 'T' and s[19] == 'Z':
+        return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]))
+
+    match = GPX_TIME_PATTERN.match(s.strip())
+
+    if match is None:
+        raise ValueError(f'Unrecognized GPX time {s!r}')
+
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    dt = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+
+    if fraction is not None:
+        dt += timedelta(microseconds=int(fraction[:6].ljust(6, '0')))
+
+    if offset is not None and offset != 'Z':
+        offset_delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[-2:]))
+        dt = dt - offset_delta if offset[0] == '+' else dt + offset_delta
+
+    return dt
+
+def trkpt_datetime(trkpt: ET.ElementTree, time_tag: str) -> Optional[datetime]:
+    '''
+    Returns None if the trkpt has no time.
+    '''
+    time_elem = trkpt.find(time_tag)
 
-def trkpt_has_time(trkpt: ET.ElementTree, namespaces) -> bool:
-    return trkpt.find('gpx:time', namespaces) is not None
+    if time_elem is None:
+        return None
 
-def trkpt_datetime(trkpt: ET.ElementTree, namespaces: Dict[str, str]) -> datetime:
-    time_elem = trkpt.find('gpx:time', namespaces)
-    return datetime.strptime(time_elem.text, '%Y-%m-%dT%H:%M:%SZ')
+    return parse_gpx_time(time_elem.text)
 
-def should_separate(trkpt1: ET.ElementTree, trkpt2: ET.ElementTree, namespaces: Dict[str, str]) -> bool:
+def should_separate(time1: datetime, time2: datetime) -> bool:
     '''
     Returns True if the points are separated by a significant
     time such that a new trkseg should be started.
     '''
-    time1 = trkpt_datetime(trkpt1, namespaces)
-    time2 = trkpt_datetime(trkpt2, namespaces)
 
     if time2 < time1:
         print('Starting new track because next point is before previous point')
@@ -53,73 +162,108 @@ def should_separate(trkpt1: ET.ElementTree, trkpt2: ET.ElementTree, namespaces:
 
     td = time2 - time1
 
-    if td > timedelta(minutes=90):
+    if td > SEPARATION_THRESHOLD:
         print(f'Starting new track because next point is {td} from previous point')
         return True
 
     return False
 
-def get_trk_name(trk: ET.ElementTree, namespaces) -> str:
-    name = trk.find('gpx:name', namespaces)
+def get_trk_name(trk: ET.ElementTree, name_tag: str) -> str:
+    name = trk.find(name_tag)
     return name.text
 
-def get_trkpts(root: Iterable[ET.ElementTree], namespaces: Dict[str, str]) -> Iterable[ET.ElementTree]:
-    for trk in root.findall('gpx:trk', namespaces):
-        print(f'Found track {get_trk_name(trk, namespaces)}')
-
-        for trkseg in trk.findall('gpx:trkseg', namespaces):
-            for trkpt in trkseg:
-                yield trkpt
-
-def remove_trkpt_namespaces(trkpt: ET.ElementTree, namespaces: Dict[str, str]) -> None:
+def get_trkpts(infile_path: Path, gpx_namespace: str) -> Iterable[ET.ElementTree]:
     '''
-    By default the each trkpt and their sub-elements would have an
-    "ns0:" prefix on them.  We don't want that, so we set the tag
-    manually.
+    Streams the trkpts out of the GPX file instead of loading the
+    whole document.  Each trkpt is detached from its trkseg before
+    it's handed out, so the parsed tree doesn't keep growing and
+    memory is bounded by whatever the caller holds on to.
+
+    A trkpt's tail text may not have been parsed yet at its end event,
+    so each one is held back until the next event, which always comes
+    after that tail.
     '''
-    trkpt.tag = 'trkpt'
-    ele = trkpt.find('gpx:ele', namespaces)
-    ele.tag = 'ele'
-    time = trkpt.find('gpx:time', namespaces)
-    time.tag = 'time'
+    # The tags are expanded once up front, so lookups don't have to
+    # resolve a prefix through a namespaces dict each time.
+    trk_tag = f'{{{gpx_namespace}}}trk'
+    trkseg_tag = f'{{{gpx_namespace}}}trkseg'
+    trkpt_tag = f'{{{gpx_namespace}}}trkpt'
+    name_tag = f'{{{gpx_namespace}}}name'
+    trk = None
+    prev_trkpt = None
+
+    # Only the trk, trkseg and trkpt events make it back to Python
+    for event, elem in ET.iterparse(infile_path, events=('start', 'end'), tag=(trk_tag, trkseg_tag, trkpt_tag)):
+        if prev_trkpt is not None:
+            prev_trkpt.getparent().remove(prev_trkpt)
+            yield prev_trkpt
+            prev_trkpt = None
+
+        if event == 'start':
+            # the trk's name has been parsed by the time its first trkseg starts
+            if elem.tag == trk_tag:
+                trk = elem
+            elif elem.tag == trkseg_tag and trk is not None:
+                print(f'Found track {get_trk_name(trk, name_tag)}')
+                trk = None
+        elif elem.tag == trkpt_tag:
+            prev_trkpt = elem
+        elif elem.tag == trkseg_tag:
+            elem.getparent().remove(elem)
+        else:
+            # drop the finished trk along with anything before it, like waypoints
+            elem.clear()
+
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
 
 class Track:
-    def __init__(self, date, namespaces):
+    '''
+    The output document is built up as trkpts are added, so writing it
+    out doesn't need another pass over them.  It's in the same GPX
+    namespace as the input, with that namespace as the default, so the
+    trkpts can be moved over without touching their tags and still come
+    out without a prefix.
+    '''
+    def __init__(self, date, gpx_namespace: str):
         self.date = date
-        self.namespaces = namespaces
-        self.trkpts = []
+
+        # lxml rejects "xmlns:" attributes, so the namespace declarations
+        # have to go through nsmap instead.
+        self.gpx = ET.Element(f'{{{gpx_namespace}}}gpx', nsmap={None: gpx_namespace, 'xsi': XSI_NAMESPACE})
+        self.gpx.set('version', gpx_version(gpx_namespace))
+        self.gpx.set('creator', GPX_CREATOR)
+        self.gpx.set(f'{{{XSI_NAMESPACE}}}schemaLocation', f'{gpx_namespace} {gpx_namespace}/gpx.xsd')
+        trk = ET.SubElement(self.gpx, f'{{{gpx_namespace}}}trk')
+        name = ET.SubElement(trk, f'{{{gpx_namespace}}}name')
+        name.text = str(self.date)
+        self.trkseg = ET.SubElement(trk, f'{{{gpx_namespace}}}trkseg')
 
     def __str__(self):
-        return f'Track for {self.date} with {len(self.trkpts)} trkpts'
+        return f'Track for {self.date} with {len(self.trkseg)} trkpts'
 
     def add_trkpt(self, trkpt):
-        self.trkpts.append(trkpt)
+        self.trkseg.append(trkpt)
 
     def xml(self):
-        gpx = ET.Element('gpx', attrib={
-            'version': '1.0',
-            'creator': 'https://github.com/billallen256/photography/blob/master/gpx_per_day.py',
-            'xmlns': 'http://www.topografix.com/GPX/1/0',
-            'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-            'xsi:schemaLocation': 'http://www.topografix.com/GPX/1/0 http://www.topografix.com/GPX/1/0/gpx.xsd',
-        })
-
-        trk = ET.SubElement(gpx, 'trk')
-        name = ET.SubElement(trk, 'name')
-        name.text = str(self.date)
-        trkseg = ET.SubElement(trk, 'trkseg')
-
-        for trkpt in self.trkpts:
-            remove_trkpt_namespaces(trkpt, self.namespaces)
-            trkseg.append(trkpt)
-
-        return ET.tostring(gpx, encoding='UTF-8')
-
-    def write(self, outfile_suffix: str) -> None:
-        file_dt = datetime(self.date.year, self.date.month, self.date.day)
-        outfile_path = get_unique_path(file_dt, outfile_suffix)
-        print(f'Writing {outfile_path} with {len(self.trkpts)} points')
-        outfile_path.write_bytes(self.xml())
+        return ET.ElementTree(self.gpx)
+
+    def write(self, outfile_suffix: str, taken_names: Set[str], executor: Executor) -> Future:
+        '''
+        The output name is picked and the tree is built here, in the
+        calling thread, so only the serialization and disk writes are
+        handed off to the executor.
+        '''
+        yyyymmdd = f'{self.date.year:04d}{self.date.month:02d}{self.date.day:02d}'
+        outfile_path = get_unique_path(yyyymmdd, outfile_suffix, taken_names)
+        print(f'Writing {outfile_path} with {len(self.trkseg)} points')
+        return executor.submit(write_tree, self.xml(), outfile_path)
+
+def write_tree(tree: ET.ElementTree, outfile_path: Path) -> None:
+    # serialize straight into the file rather than building the
+    # whole document as bytes first
+    with outfile_path.open('wb', buffering=OUTPUT_BUFFER_SIZE) as outfile:
+        tree.write(outfile, encoding='UTF-8', xml_declaration=True)
 
 def setup_argparser():
     parser = ArgumentParser(description='Breaks a single GPX file into separate GPX files for each day.')
@@ -143,7 +287,20 @@ def setup_argparser():
     return parsed
 
 def get_namespaces(infile_path: Path) -> Dict[str, str]:
-    return dict([node for _, node in ET.iterparse(infile_path, events=['start-ns'])])
+    '''
+    The namespaces are declared on the root gpx element, so there's
+    no need to read any further than its start tag.
+    '''
+    namespaces = {}
+
+    for event, node in ET.iterparse(infile_path, events=('start-ns', 'start')):
+        if event == 'start':
+            break
+
+        prefix, uri = node
+        namespaces[prefix] = uri
+
+    return namespaces
 
 def gpx_schema_namespace(namespaces: Dict[str, str]) -> str:
     for _, namespace in namespaces.items():
@@ -152,31 +309,39 @@ def gpx_schema_namespace(namespaces: Dict[str, str]) -> str:
 
     raise Exception(f'Could not find gpx namespace in {namespaces}')
 
-def get_unique_path(file_dt: datetime, suffix: str) -> Path:
-    dedup_suffix = ''
+def gpx_version(gpx_namespace: str) -> str:
+    # http://www.topografix.com/GPX/1/0 is version 1.0
+    return '.'.join(gpx_namespace.rstrip('/').split('/')[-2:])
+
+def get_existing_gpx_names() -> Set[str]:
+    return {entry.name for entry in os.scandir('.') if entry.name.endswith('.gpx')}
+
+def get_unique_path(yyyymmdd: str, suffix: str, taken_names: Set[str]) -> Path:
+    '''
+    Candidate names are checked against taken_names, the .gpx files
+    that were already in the directory plus every name handed out so
+    far, rather than stat-ing each one.  The chosen name is added to
+    taken_names.
+    '''
+    dedup_suffix = 0
     sep = ''
 
     if len(suffix) > 0:
         sep = '-'
 
-    while True:
-        outfile_path = Path('{}{}{}{}.gpx'.format(file_dt.strftime('%Y%m%d'), sep, suffix, dedup_suffix))
-
-        if outfile_path.exists() and dedup_suffix == '':
-            dedup_suffix = 1
-            continue
-
-        if outfile_path.exists():
-            dedup_suffix += 1
-            continue
+    base = f'{yyyymmdd}{sep}{suffix}'
+    name = f'{base}.gpx'
 
-        break
+    while name in taken_names:
+        dedup_suffix += 1
+        name = f'{base}{dedup_suffix}.gpx'
 
-    return outfile_path
+    taken_names.add(name)
+    return Path(name)
 
-def get_privacy_zones(csv_file_path_str: str) -> List[PrivacyZone]:
+def get_privacy_zones(csv_file_path_str: str) -> PrivacyZones:
     if csv_file_path_str == '':
-        return []
+        return PrivacyZones([])
 
     csv_file_path = Path(csv_file_path_str)
     privacy_zones = []
@@ -184,33 +349,92 @@ def get_privacy_zones(csv_file_path_str: str) -> List[PrivacyZone]:
     if not csv_file_path.exists():
         raise Exception(f'Privacy zone CSV files does not exist at {csv_file_path_str}')
 
-    with csv_file_path.open('r') as csv_file:
-        reader = DictReader(csv_file)
+    with csv_file_path.open('r', newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, [])
+        columns = ('name', 'radius_meters', 'latitude', 'longitude')
+
+        if not all(column in header for column in columns):
+            raise Exception(f'Privacy zone CSV file at {csv_file_path_str} needs a header with {",".join(columns)}')
+
+        name, radius_meters, latitude, longitude = (header.index(column) for column in columns)
+
+        for row in reader:
+            if len(row) == 0:
+                continue
 
-        for entry in reader:
             privacy_zones.append(
                 PrivacyZone(
-                    entry['name'],
-                    float(entry['radius_meters']),
-                    Point(float(entry['latitude']), float(entry['longitude'])),
+                    row[name],
+                    float(row[radius_meters]),
+                    Point(float(row[latitude]), float(row[longitude])),
             ))
 
-    return privacy_zones
+    return PrivacyZones(privacy_zones)
 
-def in_privacy_zone(point: Point, privacy_zone: PrivacyZone) -> bool:
-    return great_circle_distance(
-        point.longitude,
-        point.latitude,
-        privacy_zone.point.longitude,
-        privacy_zone.point.latitude) <= privacy_zone.radius_meters
+def privacy_zone_indices(latitudes: np.ndarray, longitudes: np.ndarray, privacy_zones: PrivacyZones) -> np.ndarray:
+    '''
+    Returns the index of the first privacy zone containing each point,
+    or -1 where a point isn't in any of them.  Most points are nowhere
+    near a zone, so the grid index and then a cheap bounding box test
+    screen out the pairs that don't need the haversine.
+    '''
+    indices = np.full(len(latitudes), -1)
+    latitudes = np.radians(latitudes)
+    longitudes = np.radians(longitudes)
+    points, zones = privacy_zones.candidates(latitudes, longitudes)
+
+    longitude_differences = np.abs(longitudes[points] - privacy_zones.longitudes[zones])
+    longitude_differences = np.minimum(longitude_differences, 2 * np.pi - longitude_differences)
+    near = (np.abs(latitudes[points] - privacy_zones.latitudes[zones]) <= privacy_zones.latitude_deltas[zones]) \
+        & (longitude_differences <= privacy_zones.longitude_deltas[zones])
+    points = points[near]
+    zones = zones[near]
+
+    if len(points) == 0:
+        return indices
+
+    a = np.sin((privacy_zones.latitudes[zones] - latitudes[points]) / 2) ** 2 \
+        + privacy_zones.cos_latitudes[zones] * np.cos(latitudes[points]) \
+        * np.sin((privacy_zones.longitudes[zones] - longitudes[points]) / 2) ** 2
+    inside = 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(a)) <= privacy_zones.radii[zones]
+
+    # the candidates are ordered by point and then zone, so the first
+    # occurrence of each point is its lowest numbered zone
+    inside_points, first = np.unique(points[inside], return_index=True)
+    indices[inside_points] = zones[inside][first]
+    return indices
+
+def outside_privacy_zones(timed_trkpts: Iterable[Tuple[ET.ElementTree, datetime]], privacy_zones: PrivacyZones) -> Iterable[Tuple[ET.ElementTree, datetime]]:
+    '''
+    Yields the (trkpt, datetime) pairs whose trkpt isn't in any privacy
+    zone.  The points are checked a batch at a time so the distance
+    math runs in NumPy over the whole batch at once.
+    '''
+    if len(privacy_zones) == 0:
+        yield from timed_trkpts
+        return
 
-def in_any_privacy_zone(point: Point, privacy_zones: List[PrivacyZone]) -> bool:
-    for privacy_zone in privacy_zones:
-        if in_privacy_zone(point, privacy_zone):
-            print(f'Found {point} in {privacy_zone.name}')
-            return True
+    timed_trkpts = iter(timed_trkpts)
 
-    return False
+    while True:
+        batch = list(islice(timed_trkpts, PRIVACY_ZONE_BATCH_SIZE))
+
+        if len(batch) == 0:
+            return
+
+        zone_indices = privacy_zone_indices(
+            np.array([trkpt.attrib['lat'] for trkpt, _ in batch], dtype=float),
+            np.array([trkpt.attrib['lon'] for trkpt, _ in batch], dtype=float),
+            privacy_zones,
+        )
+
+        for timed_trkpt, zone_index in zip(batch, zone_indices):
+            if zone_index >= 0:
+                print(f'Found {trkpt_to_point(timed_trkpt[0])} in {privacy_zones.privacy_zones[zone_index].name}')
+                continue
+
+            yield timed_trkpt
 
 def trkpt_to_point(trkpt) -> Point:
     return Point(
@@ -223,36 +447,40 @@ def main():
     infile_path = Path(args.input)
     outfile_suffix = args.suffix.strip()
     privacy_zones = get_privacy_zones(args.privacy_zones)
-    epoch_offset = args.epoch_offset
+    epoch_offset_delta = get_epoch_offset_delta(args.epoch_offset)
 
     gpx_namespace = gpx_schema_namespace(get_namespaces(infile_path))
     print(f'Using gpx namespace {gpx_namespace}')
-    namespaces = {'gpx': gpx_namespace}
+    time_tag = f'{{{gpx_namespace}}}time'
 
-    orig_root = ET.parse(infile_path).getroot()
-    prev_trkpt = None
+    taken_names = get_existing_gpx_names()
+    prev_dt = None
     current_track = None
+    writes = []
 
-    for trkpt in get_trkpts(orig_root, namespaces):
-        if not trkpt_has_time(trkpt, namespaces):
-            continue
+    # Each time is looked up and parsed once here, then carried forward
+    # rather than re-parsed for both sides of every pair.
+    timed_trkpts = ( (trkpt, trkpt_datetime(trkpt, time_tag)) for trkpt in get_trkpts(infile_path, gpx_namespace) )
+    timed_trkpts = ( (trkpt, dt) for trkpt, dt in timed_trkpts if dt is not None )
 
-        if in_any_privacy_zone(trkpt_to_point(trkpt), privacy_zones):
-            continue
+    # Each day's file is independent, so they're written in the
+    # background while the rest of the input is still being parsed.
+    with ThreadPoolExecutor(max_workers=WRITER_THREADS) as executor:
+        for trkpt, dt in outside_privacy_zones(timed_trkpts, privacy_zones):
+            if prev_dt is None or should_separate(prev_dt, dt):
+                if current_track is not None:
+                    writes.append(current_track.write(outfile_suffix, taken_names, executor))
 
-        if prev_trkpt is None or (prev_trkpt is not None and should_separate(prev_trkpt, trkpt, namespaces)):
-            if current_track is not None:
-                current_track.write(outfile_suffix)
+                current_track = Track(dt + epoch_offset_delta, gpx_namespace)
 
-            current_track = Track(
-                offset_datetime(trkpt_datetime(trkpt, namespaces), epoch_offset),
-                namespaces,
-            )
+            current_track.add_trkpt(trkpt)
+            prev_dt = dt
 
-        current_track.add_trkpt(trkpt)
-        prev_trkpt = trkpt
+        writes.append(current_track.write(outfile_suffix, taken_names, executor))
 
-    current_track.write(outfile_suffix)
+    # surface any exceptions raised while writing
+    for write in writes:
+        write.result()
 
 if __name__ == "__main__":
     main()
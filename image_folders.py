@@ -3,56 +3,156 @@
 # vim: expandtab tabstop=4 shiftwidth=4
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import exifread
 import logging
 import os
 import shutil
+import struct
 import sys
 
+try:
+    import fcntl
+except ImportError: # not on Windows
+    fcntl = None
+
 logging.basicConfig(level=logging.INFO)
 
 min_datetime = datetime(2015, 1, 1)
 
-def determine_capture_time(basename, extensions):
-    capture_time = None
-    possible_dates = ( get_date(basename+e) for e in extensions )
+# reading EXIF and copying are mostly waiting on the disk, so use more threads than cores
+worker_threads = min(32, (os.cpu_count() or 1) * 4)
+
+# IFD0 comes right after the TIFF header, so it's nearly always in the first block of the file
+exif_read_size = 1 << 16
+datetime_tag = 0x0132 # Image DateTime
+tiff_byte_orders = {b'II': '<', b'MM': '>'}
+tiff_header_structs = { k: struct.Struct(v + 'HI') for k, v in tiff_byte_orders.items() }
+ifd_count_structs = { k: struct.Struct(v + 'H') for k, v in tiff_byte_orders.items() }
+ifd_entry_structs = { k: struct.Struct(v + 'HHII') for k, v in tiff_byte_orders.items() }
+jpeg_segment_struct = struct.Struct('>BBH')
+
+# FICLONE is a Linux ioctl, and fcntl only has it from Python 3.12
+ficlone = getattr(fcntl, 'FICLONE', 0x40049409) if sys.platform.startswith('linux') else None
+
+# sidecars and video that exifread can't read a date from, so they go straight to
+# their mtime; everything else, including any raw format, gets its EXIF checked
+non_exif_extensions = {'.xmp', '.aae', '.pp3', '.dop', '.txt', '.json', '.xml',
+                       '.mov', '.mp4', '.m4v', '.avi', '.mts', '.m2ts', '.3gp', '.mkv',
+                       '.wav', '.mp3'}
+
+def determine_capture_time(extensions):
+    possible_dates = ( get_date(entry, ext) for ext, entry in extensions.items() )
     possible_dates = ( dt for dt in possible_dates if dt is not None )
-    possible_dates = [ dt for dt in possible_dates if dt > min_datetime ]
-
-    if len(possible_dates) == 0:
-        capture_time = None
-    elif len(possible_dates) == 1:
-        capture_time = possible_dates[0]
-    else:
-        capture_time = min(possible_dates)
+    possible_dates = ( dt for dt in possible_dates if dt > min_datetime )
 
-    return capture_time
+    # None when none of the files have a usable date
+    return min(possible_dates, default=None)
 
-def get_date(file_path):
-    exif_date = get_exif_date(file_path)
+def get_date(entry, ext):
+    if ext.lower() not in non_exif_extensions:
+        exif_date = get_exif_date(entry.path)
 
-    if exif_date is not None:
-        return exif_date
+        if exif_date is not None:
+            return exif_date
 
-    return datetime.fromtimestamp(os.path.getmtime(file_path))
+    # the DirEntry holds on to its stat result, so this is at most one syscall
+    return datetime.fromtimestamp(entry.stat().st_mtime)
 
 def get_exif_date(file_path):
     time_field = 'Image DateTime'
 
     with open(file_path, 'rb') as f:
         try:
+            exif_date = read_exif_datetime(f.read(exif_read_size))
+
+            if exif_date is not None:
+                return parse_exif_datetime(exif_date)
+
+            # anything the quick reader can't handle goes through exifread
+            f.seek(0)
             tags = exifread.process_file(f, details=False, stop_tag=time_field)
 
             if time_field in tags:
-                return datetime.strptime(tags[time_field].values, '%Y:%m:%d %H:%M:%S')
+                return parse_exif_datetime(tags[time_field].values)
             else:
                 return None
         except Exception as e:
             logging.error(str(e))
             return None
 
+def read_exif_datetime(data):
+    '''
+    Pulls the IFD0 DateTime string straight out of a JPEG's Exif APP1
+    segment or a TIFF based raw, without exifread's pass over every tag.
+    Returns None if the structure isn't one it knows or the tag isn't
+    within data.
+    '''
+    try:
+        if data[0:2] == b'\xff\xd8':
+            offset = 2
+
+            while offset < len(data):
+                marker_prefix, marker, length = jpeg_segment_struct.unpack_from(data, offset)
+
+                # stop at the start of the image data
+                if marker_prefix != 0xff or marker == 0xda:
+                    return None
+
+                if marker == 0xe1 and data[offset+4:offset+10] == b'Exif\x00\x00':
+                    return read_ifd0_datetime(data[offset+10:offset+2+length])
+
+                offset += 2 + length
+
+            return None
+
+        return read_ifd0_datetime(data)
+    except struct.error:
+        return None
+
+def read_ifd0_datetime(tiff):
+    byte_order = tiff[0:2]
+
+    if byte_order not in tiff_byte_orders:
+        return None
+
+    magic, ifd_offset = tiff_header_structs[byte_order].unpack_from(tiff, 2)
+
+    if magic != 42:
+        return None
+
+    count, = ifd_count_structs[byte_order].unpack_from(tiff, ifd_offset)
+    entry_struct = ifd_entry_structs[byte_order]
+
+    for entry_offset in range(ifd_offset + 2, ifd_offset + 2 + 12 * count, 12):
+        tag, value_type, value_count, value_offset = entry_struct.unpack_from(tiff, entry_offset)
+
+        if tag != datetime_tag:
+            continue
+
+        # values of four bytes or less are stored in the entry itself
+        if value_count <= 4:
+            value_offset = entry_offset + 8
+
+        value = tiff[value_offset:value_offset+value_count]
+
+        if value_type != 2 or len(value) < value_count:
+            return None
+
+        return value.split(b'\x00', 1)[0].decode('ascii')
+
+    return None
+
+def parse_exif_datetime(s):
+    # EXIF dates are fixed width YYYY:MM:DD HH:MM:SS, so slice them
+    # directly and leave anything else to strptime
+    if len(s) == 19 and s[4] == ':' and s[10] == ' ':
+        return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]))
+
+    return datetime.strptime(s.strip(), '%Y:%m:%d %H:%M:%S')
+
 def determine_output_dir(output_dir, dt, default_event):
     new_dir = dt.strftime('%Y.%m.%d')
     default_event = default_event.strip()
@@ -62,9 +162,23 @@ def determine_output_dir(output_dir, dt, default_event):
 
     return output_dir + os.sep + new_dir
 
-def make_output_dir(full_path, pretend=False):
-    if not os.path.exists(full_path):
+def get_existing_names(directory):
+    if not os.path.isdir(directory):
+        return set()
+
+    return { entry.name for entry in os.scandir(directory) }
+
+def make_output_dir(full_path, existing_names, pretend=False):
+    '''
+    existing_names is a snapshot of what's in the output directory,
+    checked instead of stat-ing each dated directory, and is updated
+    as directories are made.
+    '''
+    name = os.path.basename(full_path)
+
+    if name not in existing_names:
         logging.info('Making directory {0}'.format(full_path))
+        existing_names.add(name)
 
         if not pretend:
             os.mkdir(full_path, mode=0o755)
@@ -72,23 +186,55 @@ def make_output_dir(full_path, pretend=False):
 def make_name(prefix, dt):
     return prefix.strip() + dt.strftime('%Y%m%d%H%M%S')
 
-def copy_file(from_path, to_path, pretend=False):
+def copy_file(from_path, to_path, executor, pretend=False):
+    '''
+    Logs the copy in the calling thread, so the log stays in order, and
+    hands the copy itself to the executor.  Returns its Future, or None
+    when pretending.
+    '''
     logging.info('Copying {0} to {1}'.format(from_path, to_path))
 
     if not pretend:
-        shutil.copy2(from_path, to_path)
-
-def group_files(files):
+        return executor.submit(clone_file, from_path, to_path)
+
+    return None
+
+def clone_file(from_path, to_path):
+    '''
+    Same result as shutil.copy2, but first tries a copy-on-write clone,
+    which shares the data blocks on filesystems like btrfs and XFS
+    instead of copying them.  Otherwise, and everywhere but Linux,
+    shutil.copyfile copies in the kernel where it can.
+    '''
+    cloned = False
+
+    if ficlone is not None:
+        with open(from_path, 'rb') as from_file, open(to_path, 'wb') as to_file:
+            try:
+                fcntl.ioctl(to_file.fileno(), ficlone, from_file.fileno())
+                cloned = True
+            except OSError:
+                pass
+
+    if not cloned:
+        shutil.copyfile(from_path, to_path)
+
+    shutil.copystat(from_path, to_path)
+
+def group_files(entries):
+    '''
+    Maps each basename to a dict of its extensions and their DirEntry.
+    '''
     groups = {}
 
-    for f in files:
-        basename, ext = os.path.splitext(f)
+    for entry in entries:
+        basename, ext = os.path.splitext(entry.path)
 
         if basename not in groups:
-            groups[basename] = set()
+            groups[basename] = {}
 
         if len(ext) > 0:
-            groups[basename].add(ext)
+            groups[basename][ext] = entry
 
     return groups
 
@@ -110,8 +256,8 @@ def generate_move_ops(output_paths, file_groups):
 
         # sort the basenames to preserve sequencing of files captured in the same second
         for basename in sorted(basenames):
-            for ext in file_groups[basename]:
-                from_path = basename + ext
+            for ext, entry in file_groups[basename].items():
+                from_path = entry.path
                 to_path = (output_path + seq[seq_counter]).strip() + ext
                 yield (from_path, to_path)
             seq_counter += 1
@@ -135,12 +281,16 @@ if __name__ == "__main__":
     if input_directory == output_directory:
         logging.error('Input directory cannot be the same as the output directory')
 
-    files = os.listdir(input_directory)
-    files = ( input_directory + os.sep + f for f in files )
-    files = ( f for f in files if os.path.isfile(f) )
+    # scandir reports the file type from the directory listing itself,
+    # so there's no separate stat per file to filter them
+    files = os.scandir(input_directory)
+    files = ( entry for entry in files if entry.is_file() )
     file_groups = group_files(files)
 
-    capture_times = { basename: determine_capture_time(basename, extensions) for basename, extensions in file_groups.items() }
+    with ThreadPoolExecutor(max_workers=worker_threads) as executor:
+        capture_times = executor.map(determine_capture_time, file_groups.values())
+        capture_times = dict(zip(file_groups, capture_times))
+
     file_groups = { basename: extensions for basename, extensions in file_groups.items() if capture_times[basename] is not None }
     output_dirs = { basename: determine_output_dir(output_directory, capture_times[basename], args.default_event) for basename in file_groups }
 
@@ -149,8 +299,15 @@ if __name__ == "__main__":
     output_paths = { basename: output_dirs[basename]+os.sep+make_name(args.prefix, capture_times[basename]) for basename in file_groups }
     output_paths = transpose_dict(output_paths) # transpose so we can generate the move operations as a reduce
 
+    existing_names = get_existing_names(output_directory)
+
     for d in set(output_dirs.values()):
-        make_output_dir(d, pretend=args.pretend)
+        make_output_dir(d, existing_names, pretend=args.pretend)
+
+    with ThreadPoolExecutor(max_workers=worker_threads) as executor:
+        copies = [ copy_file(from_path, to_path, executor, pretend=args.pretend) for from_path, to_path in generate_move_ops(output_paths, file_groups) ]
 
-    for from_path, to_path in generate_move_ops(output_paths, file_groups):
-        copy_file(from_path, to_path, pretend=args.pretend)
+    # surface any exceptions raised while copying
+    for copy in copies:
+        if copy is not None:
+            copy.result()